@@ -4,12 +4,18 @@ from flask import Flask, render_template, jsonify, request
 from pathlib import Path
 import markdown
 import base64
+import mmap
 import os
+import re
 import subprocess
 import shlex
 import json
 import time
 import hashlib
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 # 這兩個還是保留；operations 仍用你現有的邏輯啟停容器
 try:
@@ -17,7 +23,8 @@ try:
 except Exception:
     VulhubManager = None
 
-from operations import VulhubOperations
+from operations import VulhubOperations, local_docker_images
+from vulhub_common import docker_api, is_skipped_dir, normalize_image_ref, parse_compose_fast
 
 app = Flask(__name__)
 
@@ -25,6 +32,7 @@ app = Flask(__name__)
 VULHUB_PATH = Path(os.environ.get('VULHUB_PATH', './vulhub')).resolve()
 CACHE_FILE = Path.home() / '.vulhub_manager_cache.json'  # 持久化快取檔案
 CACHE_TTL_MS = 24 * 60 * 60 * 1000  # 快取有效期：24 小時
+SCAN_WORKERS = 32  # 掃描環境時的並行執行緒數
 
 if VulhubManager:
     try:
@@ -36,11 +44,53 @@ else:
 
 ops = VulhubOperations()
 
+# README 轉 HTML 共用同一個 Markdown 實例（extension 只註冊一次）；實例非 thread-safe，用鎖保護
+_MD = markdown.Markdown(extensions=['extra', 'tables', 'fenced_code'])
+_MD_LOCK = threading.Lock()
+
+
+@dataclass
+class Env:
+    """前端用的環境資料（掃描結果與快取共用；用 __slots__ 省掉每筆的 __dict__）"""
+    __slots__ = ('name', 'category', 'cve', 'status', 'ports', 'services', 'has_exploit',
+                 'has_images', 'has_readme', 'has_readme_zh', 'has_docker_images')
+    name: str
+    category: str
+    cve: str
+    status: str
+    ports: dict
+    services: list
+    has_exploit: bool
+    has_images: bool
+    has_readme: bool
+    has_readme_zh: bool
+    has_docker_images: bool
+
+
 # 內部快取（避免每次都跑全掃）
 _env_cache = {
-    "data": None,     # list[dict]
+    "data": None,     # list[Env]
+    "ts": 0,          # epoch ms
+    "payload": None   # (etag, JSON bytes)；data 變動時清掉，下次回應再算
+}
+
+# 環境名稱 -> _env_cache["data"] 的索引，讓啟停時更新狀態不必線性搜尋
+_env_index = {}
+
+# docker-compose.yml 清單的短期快取：同一輪「驗證快取 → 重掃 → 存檔」只走一次目錄樹
+_scan_state = {
+    "key": None,      # (VULHUB_PATH, 根目錄 mtime)
+    "files": None,    # list[Path]
     "ts": 0           # epoch ms
 }
+_scan_state_lock = threading.Lock()
+COMPOSE_LIST_TTL_MS = 10 * 1000
+# 已解析的 compose：(路徑, mtime_ns) -> (services, images)
+_compose_cache = {}
+_compose_cache_lock = threading.Lock()
+COMPOSE_CACHE_MAX = 4096
+# 掃描時 docker image inspect 備援結果的鎖（結果本身存在每輪掃描的 dict）
+_image_exists_lock = threading.Lock()
 
 # 可用時嘗試載入 PyYAML 解析 compose
 try:
@@ -48,6 +98,17 @@ try:
 except Exception:
     yaml = None
 
+# 可用時用 orjson 讀寫持久化快取（沒有就退回標準 json）
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+# compose 中的 `image: xxx`（無法用 YAML 解析時的備援）
+_COMPOSE_IMAGE_RE = re.compile(r'^\s*image:\s*([^\s#]+)', re.MULTILINE)
+# compose ports 項目的 host port：[ip:]host:container[/proto]
+_HOST_PORT_RE = re.compile(r'(?:\d+\.\d+\.\d+\.\d+:)?(\d+):\d+')
+
 
 # ====== 小工具 ======
 
@@ -55,6 +116,54 @@ def _now_ms():
     return int(time.time() * 1000)
 
 
+def _set_env_cache(data):
+    """更新記憶體快取，並重建名稱索引"""
+    _env_cache["data"] = data
+    _env_cache["ts"] = _now_ms() if data is not None else 0
+    _env_cache["payload"] = None
+    _env_index.clear()
+    for i, e in enumerate(data or []):
+        _env_index[e.name] = i
+
+
+def _update_env_status(name, status):
+    """依名稱更新快取中的 status（O(1)）"""
+    idx = _env_index.get(name)
+    if idx is not None and _env_cache["data"]:
+        _env_cache["data"][idx].status = status
+        _env_cache["payload"] = None
+
+
+def _env_to_dict(e):
+    """Env 轉成 dict（只在序列化時用；淺拷貝即可）"""
+    if isinstance(e, Env):
+        return {k: getattr(e, k) for k in Env.__slots__}
+    raise TypeError(f"Object of type {type(e).__name__} is not JSON serializable")
+
+
+def _json_bytes(obj):
+    """序列化成 JSON bytes（有 orjson 就用 orjson；orjson 原生支援 dataclass）"""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_env_to_dict).encode('utf-8')
+
+
+def _env_list_response():
+    """
+    回傳記憶體快取中的環境清單，附 ETag
+    序列化結果與 ETag 快取起來；client 帶相同 If-None-Match 時直接回 304
+    """
+    payload = _env_cache["payload"]
+    if payload is None:
+        body = _json_bytes(_env_cache["data"] or [])
+        payload = (hashlib.blake2b(body, digest_size=16).hexdigest(), body)
+        _env_cache["payload"] = payload
+    etag, body = payload
+    resp = app.response_class(body, mimetype='application/json')
+    resp.set_etag(etag)
+    return resp.make_conditional(request)
+
+
 def _read_text(p: Path):
     try:
         return p.read_text(encoding='utf-8', errors='ignore')
@@ -62,11 +171,65 @@ def _read_text(p: Path):
         return ''
 
 
+def _list_compose_files():
+    """
+    列出 VULHUB_PATH 下所有 docker-compose.yml
+    用 os.walk（比 pathlib.rglob 少建很多 Path 物件）並略過隱藏目錄、node_modules 等（is_skipped_dir）；
+    結果以 (VULHUB_PATH, 根目錄 mtime) 為 key 短暫快取，讓雜湊計算與掃描共用同一次走訪
+    """
+    try:
+        key = (str(VULHUB_PATH), VULHUB_PATH.stat().st_mtime_ns)
+    except OSError:
+        key = None
+
+    with _scan_state_lock:
+        if (key is not None and _scan_state["key"] == key
+                and _now_ms() - _scan_state["ts"] < COMPOSE_LIST_TTL_MS):
+            return _scan_state["files"]
+
+        compose_files = []
+        for dirpath, dirnames, filenames in os.walk(VULHUB_PATH, followlinks=False):
+            dirnames[:] = [d for d in dirnames if not is_skipped_dir(d)]
+            if 'docker-compose.yml' in filenames:
+                compose_files.append(Path(dirpath) / 'docker-compose.yml')
+
+        _scan_state["key"] = key
+        _scan_state["files"] = compose_files
+        _scan_state["ts"] = _now_ms()
+        return compose_files
+
+
+def _reset_compose_list():
+    """丟掉 docker-compose.yml 清單快取，下次強制重新走目錄樹"""
+    with _scan_state_lock:
+        _scan_state["key"] = None
+        _scan_state["files"] = None
+
+
 def _calculate_vulhub_hash():
-    """計算 Vulhub 目錄的簡單雜湊值，用於判斷是否有變化"""
+    """
+    快速雜湊：只看根目錄與第一層分類目錄的 mtime（幾次 stat，不走整棵樹）
+    目錄底下新增/刪除項目時 mtime 就會變，用來快速判斷快取是否可能過時
+    """
+    try:
+        h = hashlib.md5()
+        h.update(str(VULHUB_PATH.stat().st_mtime_ns).encode())
+        with os.scandir(VULHUB_PATH) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and not is_skipped_dir(entry.name):
+                h.update(entry.name.encode())
+                h.update(str(entry.stat(follow_symlinks=False).st_mtime_ns).encode())
+        return h.hexdigest()
+    except Exception:
+        return None
+
+
+def _calculate_compose_paths_hash():
+    """計算所有 docker-compose.yml 相對路徑的雜湊（需走整棵樹；快速雜湊不符時才用）"""
     try:
         # 只計算 docker-compose.yml 檔案的數量和路徑
-        compose_files = list(VULHUB_PATH.rglob('docker-compose.yml'))
+        compose_files = _list_compose_files()
         paths_str = ''.join(sorted([str(f.relative_to(VULHUB_PATH)) for f in compose_files]))
         return hashlib.md5(paths_str.encode()).hexdigest()
     except Exception:
@@ -77,8 +240,8 @@ def _load_persistent_cache():
     """從檔案載入持久化快取"""
     try:
         if CACHE_FILE.exists():
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
+            raw = CACHE_FILE.read_bytes()
+            cache_data = orjson.loads(raw) if orjson else json.loads(raw)
                 
             # 檢查快取是否過期
             cache_ts = cache_data.get('timestamp', 0)
@@ -86,15 +249,17 @@ def _load_persistent_cache():
                 print("快取已過期，需要重新掃描")
                 return None
                 
-            # 檢查 Vulhub 目錄是否有變化
+            # 檢查 Vulhub 目錄是否有變化：先比對快速雜湊，不符再走完整清單確認
             saved_hash = cache_data.get('vulhub_hash')
-            current_hash = _calculate_vulhub_hash()
-            if saved_hash != current_hash:
-                print("偵測到 Vulhub 目錄有變化，需要重新掃描")
-                return None
+            if saved_hash != _calculate_vulhub_hash():
+                saved_paths_hash = cache_data.get('compose_paths_hash')
+                if not saved_paths_hash or saved_paths_hash != _calculate_compose_paths_hash():
+                    print("偵測到 Vulhub 目錄有變化，需要重新掃描")
+                    return None
                 
-            print(f"從持久化快取載入 {len(cache_data.get('environments', []))} 個環境")
-            return cache_data.get('environments', [])
+            envs = [Env(**d) for d in cache_data.get('environments', [])]
+            print(f"從持久化快取載入 {len(envs)} 個環境")
+            return envs
     except Exception as e:
         print(f"載入快取失敗: {e}")
     return None
@@ -107,173 +272,263 @@ def _save_persistent_cache(environments):
             'environments': environments,
             'timestamp': _now_ms(),
             'vulhub_hash': _calculate_vulhub_hash(),
+            'compose_paths_hash': _calculate_compose_paths_hash(),
             'vulhub_path': str(VULHUB_PATH)
         }
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        CACHE_FILE.write_bytes(_json_bytes(cache_data))
         print(f"已保存 {len(environments)} 個環境到持久化快取")
     except Exception as e:
         print(f"保存快取失敗: {e}")
 
 
-def _compose_parse_services_ports(compose_path: Path):
+def _load_compose(compose_path: Path):
     """
-    嘗試從 docker-compose.yml 解析 service 名稱與 host 端口（若沒裝 PyYAML 就回空）
-    回傳: (services: list[str], ports_map: dict[str, str])
+    解析 docker-compose.yml 一次，給掃描流程共用
+    回傳: (services: dict[str, dict], images: list[str])；結果為共用快取，呼叫端不要修改
+    先走 parse_compose_fast，看不懂的寫法才退回 PyYAML；image 再抓不到就用正則
+    以 (路徑, mtime) 快取，檔案沒變就不重新解析
     """
-    services, ports_map = [], {}
-    if not compose_path.exists():
-        return services, ports_map
+    try:
+        key = (str(compose_path), compose_path.stat().st_mtime_ns)
+    except OSError:
+        return {}, []
+
+    with _compose_cache_lock:
+        hit = _compose_cache.get(key)
+    if hit is not None:
+        return hit
+
+    result = _parse_compose_file(compose_path)
+    with _compose_cache_lock:
+        if len(_compose_cache) >= COMPOSE_CACHE_MAX:
+            _compose_cache.pop(next(iter(_compose_cache)))
+        _compose_cache[key] = result
+    return result
+
+
+def _parse_compose_file(compose_path: Path):
+    """_load_compose 的實際解析（不經快取）"""
+    try:
+        raw = compose_path.read_bytes()
+    except Exception:
+        raw = b''
+    text = raw.decode('utf-8', errors='ignore')
+
+    try:
+        data = parse_compose_fast(raw)
+    except ValueError:
+        data = None
+        if yaml:
+            try:
+                data = yaml.safe_load(text)
+            except Exception:
+                data = None
 
-    if yaml:
+    services = {}
+    if data:
         try:
-            data = yaml.safe_load(_read_text(compose_path)) or {}
-            svcs = data.get('services') or {}
-            for svc_name, svc_cfg in svcs.items():
-                services.append(str(svc_name))
-                port_list = svc_cfg.get('ports') or []
-                host_ports = []
-                for item in port_list:
-                    # 可能是 "8080:80" 或 "127.0.0.1:8080:80" 或 dict
-                    if isinstance(item, str):
-                        # 取最左邊 host port（冒號前一段最後的數字）
-                        parts = item.split(':')
-                        if len(parts) >= 2:
-                            # 127.0.0.1:8080:80 -> 取 -2 位置
-                            try:
-                                host_ports.append(str(int(parts[-2])))
-                            except Exception:
-                                # "8080:80" -> 取 -2 仍是 8080；若格式怪就忽略
-                                pass
-                        else:
-                            # "8080" 這種，不太常見，直接塞
-                            host_ports.append(parts[0])
-                    elif isinstance(item, dict):
-                        # {"target": 80, "published": 8080, "mode": "host", "protocol": "tcp"}
-                        hp = item.get('published')
-                        if hp:
-                            host_ports.append(str(hp))
-                if host_ports:
-                    # 取第一個 host port 當代表
-                    ports_map[svc_name] = host_ports[0]
+            for svc_name, svc_cfg in (data.get('services') or {}).items():
+                if not isinstance(svc_cfg, dict):
+                    svc_cfg = {}
+                # ports 寫成純量（如 ports: 8080）等非清單值一律丟掉，後續只處理 list
+                ports = svc_cfg.get('ports')
+                services[str(svc_name)] = {
+                    'image': svc_cfg.get('image'),
+                    'ports': ports if isinstance(ports, list) else [],
+                }
         except Exception:
-            pass
+            services = {}
+
+    images = [str(svc['image']) for svc in services.values() if svc.get('image')]
+    # 如果無法解析 YAML，嘗試用正則表達式
+    if not images:
+        images = _COMPOSE_IMAGE_RE.findall(text)
+
+    return services, images
+
+
+def _compose_parse_services_ports(svcs: dict):
+    """
+    從 _load_compose 的結果整理 service 名稱與 host 端口
+    回傳: (services: list[str], ports_map: dict[str, str])
+    """
+    services, ports_map = [], {}
+    for svc_name, svc_cfg in svcs.items():
+        services.append(str(svc_name))
+        port_list = svc_cfg.get('ports') or []
+        host_ports = []
+        for item in port_list:
+            # 可能是 "8080:80" 或 "127.0.0.1:8080:80" 或 dict
+            if isinstance(item, (str, int)):
+                # "8080:80" 或 "127.0.0.1:8080:80/tcp" -> 8080；只有 container port 的寫法沒有 host port
+                m = _HOST_PORT_RE.match(str(item))
+                if m:
+                    host_ports.append(m.group(1))
+            elif isinstance(item, dict):
+                # {"target": 80, "published": 8080, "mode": "host", "protocol": "tcp"}
+                hp = item.get('published')
+                if hp:
+                    host_ports.append(str(hp))
+        if host_ports:
+            # 取第一個 host port 當代表
+            ports_map[svc_name] = host_ports[0]
 
     return services, ports_map
 
 
-def _has_exploit(env_dir: Path):
-    # 粗略偵測：有 exploit/ 或 poc/ 目錄、或常見檔名
-    for sub in ['exploit', 'exploits', 'poc', 'pocs']:
-        if (env_dir / sub).exists():
-            return True
-    for pat in ['*exploit*.py', '*exploit*.sh', 'poc.py', 'poc.sh', 'exp.py', 'PoC.py']:
-        if list(env_dir.glob(pat)):
-            return True
-    return False
+_IMAGE_EXTS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.svg'})
+_EXPLOIT_SUBDIRS = ('exploit', 'exploits', 'poc', 'pocs')
+_EXPLOIT_DIRS = frozenset(_EXPLOIT_SUBDIRS)
+# 根目錄常見 exploit 檔名：*exploit*.py / *exploit*.sh / poc.py / poc.sh / exp.py …
+_EXPLOIT_NAME_RE = re.compile(r'exploit.*\.(?:py|sh)$|^(?:poc|exp)\.(?:py|sh)$', re.IGNORECASE)
+_EXPLOIT_FILE_EXTS = frozenset({'.py', '.sh', '.rb', '.go', '.c', '.cpp'})
 
 
-def _image_files(env_dir: Path):
-    exts = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.svg'}
-    # 只拿目錄內第一層圖片（避免掃爆）
-    return [p for p in env_dir.iterdir() if p.is_file() and p.suffix.lower() in exts]
+def _classify_env_dir(env_dir: Path):
+    """
+    只用一次 os.scandir 走過環境目錄第一層，一次分類出：
+    圖片檔名、exploit 子目錄名稱、是否有 exploit（子目錄或常見檔名）、README 有無
+    """
+    info = {
+        "images": [],
+        "exploit_dirs": [],
+        "has_exploit": False,
+        "has_readme": False,
+        "has_readme_zh": False,
+    }
+    try:
+        with os.scandir(env_dir) as it:
+            for entry in it:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    # 粗略偵測：有 exploit/ 或 poc/ 目錄
+                    if name.lower() in _EXPLOIT_DIRS:
+                        info["exploit_dirs"].append(name)
+                        info["has_exploit"] = True
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if name == 'README.md':
+                    info["has_readme"] = True
+                elif name in ('README.zh-cn.md', 'README_zh.md'):
+                    info["has_readme_zh"] = True
+                elif os.path.splitext(name)[1].lower() in _IMAGE_EXTS:
+                    # 只拿目錄內第一層圖片（避免掃爆）
+                    info["images"].append(name)
+                elif not info["has_exploit"] and _EXPLOIT_NAME_RE.search(name):
+                    info["has_exploit"] = True
+    except OSError:
+        pass
+    return info
+
+
+def _image_exists(ref: str, image_exists_cache: dict):
+    """
+    用 `docker image inspect` 檢查單一映像（拿不到本地映像清單時的備援）
+    結果記在本輪掃描共用的 image_exists_cache，同一個映像只問一次
+    """
+    with _image_exists_lock:
+        hit = image_exists_cache.get(ref)
+    if hit is not None:
+        return hit
+    try:
+        result = subprocess.run(
+            ['docker', 'image', 'inspect', ref],
+            capture_output=True,
+            timeout=2
+        )
+        exists = result.returncode == 0
+    except Exception:
+        exists = False
+    with _image_exists_lock:
+        image_exists_cache[ref] = exists
+    return exists
 
 
-def _check_docker_images_exist(compose_path: Path):
+def _check_docker_images_exist(images_to_check: list, local_images, image_exists_cache: dict):
     """
     檢查 docker-compose.yml 中定義的映像是否已存在本地
+    images_to_check 為 _load_compose 抽出的映像；local_images 為 local_docker_images() 的結果，
+    為 None（取不到清單）時改逐一 inspect，並透過 image_exists_cache 跨環境去重
     """
-    images_to_check = []
-    
-    if yaml and compose_path.exists():
-        try:
-            data = yaml.safe_load(_read_text(compose_path)) or {}
-            svcs = data.get('services') or {}
-            for svc_name, svc_cfg in svcs.items():
-                if 'image' in svc_cfg:
-                    images_to_check.append(svc_cfg['image'])
-        except Exception:
-            pass
-    
-    # 如果無法解析 YAML，嘗試用正則表達式
-    if not images_to_check:
-        try:
-            content = _read_text(compose_path)
-            import re
-            # 匹配 image: xxx 格式
-            images = re.findall(r'^\s*image:\s*([^\s#]+)', content, re.MULTILINE)
-            images_to_check = images
-        except Exception:
-            pass
-    
     if not images_to_check:
         return False
     
     # 檢查所有映像是否存在
-    all_exist = True
     for image in images_to_check:
-        try:
-            result = subprocess.run(
-                ['docker', 'image', 'inspect', image],
-                capture_output=True,
-                timeout=2
-            )
-            if result.returncode != 0:
-                all_exist = False
-                break
-        except Exception:
-            all_exist = False
-            break
-    
-    return all_exist
+        ref = normalize_image_ref(str(image))
+        if local_images is not None:
+            exists = ref in local_images
+        else:
+            exists = _image_exists(ref, image_exists_cache)
+        if not exists:
+            return False
+    return True
+
+
+def _scan_one(compose_path: Path, local_images, image_exists_cache: dict):
+    """掃描單一環境，回傳前端需要的扁平資料"""
+    env_dir = compose_path.parent
+    rel = env_dir.relative_to(VULHUB_PATH).as_posix()  # e.g. "nexus/CVE-2020-10199"
+    parts = rel.split('/')
+    category = parts[0] if parts else 'unknown'
+    cve = parts[-1] if parts else 'unknown'
+
+    svcs, compose_images = _load_compose(compose_path)
+    services, ports_map = _compose_parse_services_ports(svcs)
+    dir_info = _classify_env_dir(env_dir)
+
+    # 檢查 Docker 映像是否已存在
+    has_docker_images = _check_docker_images_exist(compose_images, local_images, image_exists_cache)
+
+    return Env(
+        name=rel,
+        category=category,
+        cve=cve,
+        status="unknown",                  # 由前端啟/停後更新
+        ports=ports_map,                   # 盡量解析；失敗就空 dict
+        services=services,                 # 盡量解析；失敗就空 list
+        has_exploit=dir_info["has_exploit"],
+        has_images=bool(dir_info["images"]),
+        has_readme=dir_info["has_readme"],
+        has_readme_zh=dir_info["has_readme_zh"],
+        has_docker_images=has_docker_images,  # 是否已有 Docker 映像
+    )
 
 
 def _scan_environments_fs():
     """
     檔案系統掃描：尋找所有包含 docker-compose.yml 的資料夾
     產出前端需要的扁平資料
+    每個環境彼此獨立，丟給執行緒池並行處理（主要耗時在檔案 I/O 與 docker 子行程）
     """
     if not VULHUB_PATH.exists():
         raise FileNotFoundError(f"Vulhub path does not exist: {VULHUB_PATH}")
 
-    envs = []
-    compose_files = list(VULHUB_PATH.rglob('docker-compose.yml'))
+    compose_files = _list_compose_files()
     total = len(compose_files)
     print(f"找到 {total} 個環境，開始掃描...")
 
-    for i, compose_path in enumerate(compose_files, 1):
-        env_dir = compose_path.parent
-        rel = env_dir.relative_to(VULHUB_PATH).as_posix()  # e.g. "nexus/CVE-2020-10199"
-        parts = rel.split('/')
-        category = parts[0] if parts else 'unknown'
-        cve = parts[-1] if parts else 'unknown'
-
-        services, ports_map = _compose_parse_services_ports(compose_path)
-        has_readme = (env_dir / 'README.md').exists()
-        has_readme_zh = (env_dir / 'README.zh-cn.md').exists() or (env_dir / 'README_zh.md').exists()
-        imgs = _image_files(env_dir)
-        
-        # 檢查 Docker 映像是否已存在
-        has_docker_images = _check_docker_images_exist(compose_path)
-
-        envs.append({
-            "name": rel,
-            "category": category,
-            "cve": cve,
-            "status": "unknown",              # 由前端啟/停後更新
-            "ports": ports_map,               # 盡量解析；失敗就空 dict
-            "services": services,             # 盡量解析；失敗就空 list
-            "has_exploit": _has_exploit(env_dir),
-            "has_images": bool(imgs),
-            "has_readme": has_readme,
-            "has_readme_zh": has_readme_zh,
-            "has_docker_images": has_docker_images,  # 新增：是否已有 Docker 映像
-        })
-
-        if i % 50 == 0 or i == total:
-            print(f"已掃描 {i}/{total} 個環境...")
-
-    envs.sort(key=lambda x: x["name"])
+    # 一次取得本地映像清單，避免每個 image 都 fork 一次 docker image inspect；
+    # 取不到清單時才逐一 inspect，同一映像在本輪掃描只問一次
+    local_images = local_docker_images()
+    image_exists_cache = {}
+
+    done = itertools.count(1)
+    progress_lock = threading.Lock()
+
+    def _worker(compose_path):
+        env = _scan_one(compose_path, local_images, image_exists_cache)
+        with progress_lock:
+            i = next(done)
+            if i % 50 == 0 or i == total:
+                print(f"已掃描 {i}/{total} 個環境...")
+        return env
+
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        envs = list(executor.map(_worker, compose_files))
+
+    envs.sort(key=lambda x: x.name)
     print(f"掃描完成，共找到 {len(envs)} 個有效環境")
     return envs
 
@@ -288,23 +543,40 @@ def _get_env_dir_by_name(name: str) -> Path:
 
 
 def _get_exploit_files(env_dir: Path):
-    """獲取 exploit 檔案列表"""
+    """
+    獲取 exploit 檔案列表
+    子目錄名稱的判斷與 _classify_env_dir 相同（不分大小寫比對 _EXPLOIT_DIRS），兩邊結果才會一致
+    """
     exploit_files = []
+    root_files = []
+    sub_dirs = []
+    env_dir_str = str(env_dir)
     
-    # 檢查 exploit 目錄
-    for sub in ['exploit', 'exploits', 'poc', 'pocs']:
-        sub_dir = env_dir / sub
-        if sub_dir.exists() and sub_dir.is_dir():
-            for f in sub_dir.iterdir():
-                if f.is_file() and f.suffix in ['.py', '.sh', '.rb', '.go', '.c', '.cpp']:
-                    exploit_files.append(f)
+    # 一次 scandir 找出 exploit 子目錄與根目錄的 exploit 檔案
+    try:
+        with os.scandir(env_dir_str) as it:
+            for entry in it:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if name.lower() in _EXPLOIT_DIRS:
+                        sub_dirs.append(name)
+                elif entry.is_file() and _EXPLOIT_NAME_RE.search(name):
+                    root_files.append(env_dir / name)
+    except OSError:
+        pass
     
-    # 檢查根目錄的 exploit 檔案
-    for pattern in ['*exploit*.py', '*exploit*.sh', 'poc.py', 'poc.sh', 'exp.py', 'PoC.py']:
-        for f in env_dir.glob(pattern):
-            if f.is_file():
-                exploit_files.append(f)
+    # 檢查 exploit 目錄（依 _EXPLOIT_SUBDIRS 的順序）
+    sub_dirs.sort(key=lambda d: (_EXPLOIT_SUBDIRS.index(d.lower()), d))
+    for sub in sub_dirs:
+        try:
+            with os.scandir(os.path.join(env_dir_str, sub)) as it:
+                for entry in it:
+                    if entry.is_file() and os.path.splitext(entry.name)[1] in _EXPLOIT_FILE_EXTS:
+                        exploit_files.append(env_dir / sub / entry.name)
+        except OSError:
+            pass
     
+    exploit_files.extend(root_files)
     return exploit_files
 
 
@@ -327,18 +599,19 @@ def api_scan():
 
     # 優先使用記憶體快取
     if use_cache and _env_cache["data"]:
-        return jsonify(_env_cache["data"])
+        return _env_list_response()
 
     # 嘗試從持久化快取載入
     if use_cache:
         cached_envs = _load_persistent_cache()
         if cached_envs:
-            _env_cache["data"] = cached_envs
-            _env_cache["ts"] = _now_ms()
-            return jsonify(cached_envs)
+            _set_env_cache(cached_envs)
+            return _env_list_response()
 
     # 需要重新掃描
     print("執行完整掃描...")
+    if not use_cache:
+        _reset_compose_list()
     
     # 若你的 VulhubManager 有類似 .environments 可用，就先像它
     envs = None
@@ -349,28 +622,17 @@ def api_scan():
             envs = None
 
     # envs 不是 list 就改用檔案系統掃描
+    out_is_canonical = False
     if not isinstance(envs, list) or not envs:
         envs = _scan_environments_fs()
+        out_is_canonical = True
 
-    # 標準化輸出結構
-    out = []
-    for e in envs:
-        # 如果是我自己掃描的，就已經是 dict；若是自訂物件，盡量抽取
-        if isinstance(e, dict):
-            out.append({
-                "name": e.get("name"),
-                "category": e.get("category"),
-                "cve": e.get("cve"),
-                "status": e.get("status", "unknown"),
-                "ports": e.get("ports") or {},
-                "services": e.get("services") or [],
-                "has_exploit": bool(e.get("has_exploit")),
-                "has_images": bool(e.get("has_images")),
-                "has_readme": bool(e.get("has_readme")),
-                "has_readme_zh": bool(e.get("has_readme_zh")),
-                "has_docker_images": bool(e.get("has_docker_images", False)),
-            })
-        else:
+    # 自己掃描的結果已經是標準的 Env，直接沿用；自訂物件才需要標準化
+    if out_is_canonical:
+        out = envs
+    else:
+        out = []
+        for e in envs:
             # 盡最大努力從物件取出欄位
             name = getattr(e, 'name', None) or getattr(e, 'path', None)
             if name and isinstance(name, str) and name.startswith(str(VULHUB_PATH)):
@@ -396,40 +658,44 @@ def api_scan():
                 if not cve and parts:
                     cve = parts[-1]
 
-            out.append({
-                "name": rel,
-                "category": category or 'unknown',
-                "cve": cve or 'unknown',
-                "status": status or 'unknown',
-                "ports": ports,
-                "services": services,
-                "has_exploit": has_exploit,
-                "has_images": has_images,
-                "has_readme": has_readme,
-                "has_readme_zh": has_readme_zh,
-                "has_docker_images": has_docker_images,
-            })
+            out.append(Env(
+                name=rel,
+                category=category or 'unknown',
+                cve=cve or 'unknown',
+                status=status or 'unknown',
+                ports=ports,
+                services=services,
+                has_exploit=has_exploit,
+                has_images=has_images,
+                has_readme=has_readme,
+                has_readme_zh=has_readme_zh,
+                has_docker_images=has_docker_images,
+            ))
 
     # 更新記憶體快取
-    _env_cache["data"] = out
-    _env_cache["ts"] = _now_ms()
+    _set_env_cache(out)
     
     # 保存到持久化快取
     _save_persistent_cache(out)
     
-    return jsonify(out)
+    return _env_list_response()
 
 
 @app.route('/api/stats')
 def api_stats():
     data = _env_cache["data"] or []
     total = len(data)
-    running = sum(1 for x in data if x.get("status") == "running")
-    with_exploit = sum(1 for x in data if x.get("has_exploit"))
-    with_images = sum(1 for x in data if x.get("has_docker_images"))
+    running = with_exploit = with_images = 0
     cats = {}
+    # 單趟走訪同時累計所有統計
     for x in data:
-        cats[x["category"]] = cats.get(x["category"], 0) + 1
+        if x.status == "running":
+            running += 1
+        if x.has_exploit:
+            with_exploit += 1
+        if x.has_docker_images:
+            with_images += 1
+        cats[x.category] = cats.get(x.category, 0) + 1
     return jsonify({
         "total": total,
         "running": running,
@@ -451,20 +717,50 @@ def api_env_detail(name: str):
         return jsonify({"error": "not found"}), 404
 
     compose_path = env_dir / 'docker-compose.yml'
+    dir_info = _classify_env_dir(env_dir)
+    image_names = dir_info["images"][:5]
+
+    # ETag 涵蓋回應用到的所有檔案：compose 與目錄的 mtime、exploit 子目錄的 mtime、
+    # 附圖的 mtime 與大小；都沒變就不重讀圖片、不重組回應
+    etag = None
+    try:
+        stamp = [name, compose_path.stat().st_mtime_ns, env_dir.stat().st_mtime_ns]
+        for sub in dir_info["exploit_dirs"]:
+            stamp += [sub, os.stat(os.path.join(str(env_dir), sub)).st_mtime_ns]
+        for img_name in image_names:
+            st = os.stat(os.path.join(str(env_dir), img_name))
+            stamp += [img_name, st.st_mtime_ns, st.st_size]
+        etag = hashlib.blake2b('\0'.join(map(str, stamp)).encode('utf-8'), digest_size=16).hexdigest()
+    except OSError:
+        pass
+    if etag and request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+
     compose_text = _read_text(compose_path)
 
     # 附圖（最多 5 張，<5MB）
     images_data = []
-    for img_path in _image_files(env_dir)[:5]:
+    for img_name in image_names:
+        img_path = env_dir / img_name
         try:
-            if img_path.stat().st_size < 5 * 1024 * 1024:
-                with open(img_path, 'rb') as f:
-                    b64 = base64.b64encode(f.read()).decode()
-                ext = (img_path.suffix or ".png")[1:].lower()
-                images_data.append({
-                    "name": img_path.name,
-                    "data": f"data:image/{ext};base64,{b64}"
-                })
+            with open(img_path, 'rb') as f:
+                # 開檔後再 fstat，避免 stat 與 open 之間檔案被換掉
+                size = os.fstat(f.fileno()).st_size
+                if size >= 5 * 1024 * 1024:
+                    continue
+                if size:
+                    # 直接對 mmap 編碼，省掉一份 f.read() 的完整拷貝
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        b64 = base64.b64encode(mm)
+                else:
+                    b64 = b''
+            ext = (img_path.suffix or ".png")[1:].lower()
+            images_data.append({
+                "name": img_path.name,
+                "data": f"data:image/{ext};base64," + b64.decode('ascii')
+            })
         except Exception:
             pass
 
@@ -475,7 +771,7 @@ def api_env_detail(name: str):
     category = parts[0] if parts else 'unknown'
     cve = parts[-1] if parts else 'unknown'
 
-    return jsonify({
+    resp = jsonify({
         "name": name,
         "category": category,
         "cve": cve,
@@ -483,6 +779,9 @@ def api_env_detail(name: str):
         "images": images_data,
         "exploit_files": exploit_files
     })
+    if etag:
+        resp.set_etag(etag)
+    return resp
 
 
 @app.route('/api/readme/<path:name>')
@@ -504,7 +803,10 @@ def api_readme(name: str):
             break
 
     md_text = _read_text(md_path) if md_path else ""
-    html = markdown.markdown(md_text, extensions=['extra', 'tables', 'fenced_code']) if md_text else ""
+    html = ""
+    if md_text:
+        with _MD_LOCK:
+            html = _MD.reset().convert(md_text)
     return jsonify({"html": html})
 
 
@@ -551,11 +853,8 @@ def api_start():
     name = data.get('name')
     ok, info = ops.start(name)
     # 啟動成功後，更新快取中的 status
-    if ok and _env_cache["data"]:
-        for e in _env_cache["data"]:
-            if e.get("name") == name:
-                e["status"] = "running"
-                break
+    if ok:
+        _update_env_status(name, "running")
     return jsonify({"success": ok, **(info or {})})
 
 
@@ -564,11 +863,8 @@ def api_stop():
     data = request.get_json(force=True)
     name = data.get('name')
     ok, info = ops.stop(name)
-    if ok and _env_cache["data"]:
-        for e in _env_cache["data"]:
-            if e.get("name") == name:
-                e["status"] = "stopped"
-                break
+    if ok:
+        _update_env_status(name, "stopped")
     return jsonify({"success": ok, **(info or {})})
 
 
@@ -579,6 +875,12 @@ def api_check_images():
     return jsonify({"success": ok, **(info or {})})
 
 
+# SSE 框架預先編成 bytes，逐行輸出時不用再格式化字串
+_SSE_LOG_PREFIX = b'event: log\ndata: '
+_SSE_SUFFIX = b'\n\n'
+_SSE_DONE = b'event: done\ndata: ok\n\n'
+
+
 @app.route('/api/pull-stream')
 def api_pull_stream():
     """
@@ -588,10 +890,10 @@ def api_pull_stream():
 
     def gen():
         for line in ops.pull_images_stream(name):
-            yield f"event: log\ndata: {line}\n\n"
-        yield "event: done\ndata: ok\n\n"
+            yield _SSE_LOG_PREFIX + line + _SSE_SUFFIX
+        yield _SSE_DONE
 
-    return app.response_class(gen(), mimetype='text/event-stream')
+    return app.response_class(gen(), mimetype='text/event-stream', direct_passthrough=True)
 
 
 @app.route('/api/wait-ready')
@@ -608,6 +910,26 @@ def api_wait_ready():
 # === /api/running：列出目前運行中的容器 ===
 @app.route('/api/running')
 def api_running():
+    # 優先直接問 Docker Engine API，省掉 docker CLI 的啟動成本
+    api_containers = docker_api('/containers/json')
+    if isinstance(api_containers, list):
+        containers = []
+        for obj in api_containers:
+            ports = []
+            for p in obj.get("Ports") or []:
+                if p.get("PublicPort"):
+                    ports.append(f"{p.get('IP', '')}:{p['PublicPort']}->{p.get('PrivatePort')}/{p.get('Type', 'tcp')}")
+                else:
+                    ports.append(f"{p.get('PrivatePort')}/{p.get('Type', 'tcp')}")
+            containers.append({
+                "id": (obj.get("Id") or "")[:12],
+                "name": ",".join(n.lstrip('/') for n in obj.get("Names") or []),
+                "image": obj.get("Image") or "",
+                "status": obj.get("Status") or "",
+                "ports": ", ".join(ports)
+            })
+        return jsonify({"success": True, "containers": containers})
+
     try:
         cmd = "docker ps --format {{json .}}"
         result = subprocess.run(
@@ -617,15 +939,21 @@ def api_running():
             stderr=subprocess.PIPE,
             text=True
         )
+        lines = [line for line in result.stdout.splitlines() if line.strip()]
+        # 每行一個 JSON 物件：接成一個陣列一次解析；有壞行才退回逐行解析
+        payload = '[' + ','.join(lines) + ']'
+        try:
+            objs = orjson.loads(payload) if orjson else json.loads(payload)
+        except Exception:
+            objs = []
+            for line in lines:
+                try:
+                    objs.append(json.loads(line))
+                except Exception:
+                    objs.append({})
+
         containers = []
-        for line in result.stdout.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception:
-                obj = {}
+        for obj in objs:
             containers.append({
                 "id": (obj.get("ID") or "")[:12],
                 "name": obj.get("Names") or "",
@@ -652,8 +980,8 @@ def api_refresh_cache():
     """強制清除並重建快取"""
     try:
         # 清除記憶體快取
-        _env_cache["data"] = None
-        _env_cache["ts"] = 0
+        _set_env_cache(None)
+        _reset_compose_list()
         
         # 刪除持久化快取檔案
         if CACHE_FILE.exists():
@@ -662,28 +990,11 @@ def api_refresh_cache():
         
         # 重新掃描
         print("強制重新掃描所有環境...")
-        envs = _scan_environments_fs()
-        
-        # 標準化輸出
-        out = []
-        for e in envs:
-            out.append({
-                "name": e.get("name"),
-                "category": e.get("category"),
-                "cve": e.get("cve"),
-                "status": e.get("status", "unknown"),
-                "ports": e.get("ports") or {},
-                "services": e.get("services") or [],
-                "has_exploit": bool(e.get("has_exploit")),
-                "has_images": bool(e.get("has_images")),
-                "has_readme": bool(e.get("has_readme")),
-                "has_readme_zh": bool(e.get("has_readme_zh")),
-                "has_docker_images": bool(e.get("has_docker_images", False)),
-            })
+        # 掃描結果已經是標準的 Env，不必再複製一份
+        out = _scan_environments_fs()
         
         # 更新快取
-        _env_cache["data"] = out
-        _env_cache["ts"] = _now_ms()
+        _set_env_cache(out)
         _save_persistent_cache(out)
         
         return jsonify({"success": True, "count": len(out)})
@@ -698,8 +1009,7 @@ if __name__ == '__main__':
     
     cached_data = _load_persistent_cache()
     if cached_data:
-        _env_cache["data"] = cached_data
-        _env_cache["ts"] = _now_ms()
+        _set_env_cache(cached_data)
         print(f"成功載入持久化快取，共 {len(cached_data)} 個環境")
     else:
         print("未找到有效快取，將在首次請求時掃描")
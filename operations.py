@@ -8,18 +8,53 @@ import subprocess
 import json
 import time
 import re
+import socket
 from pathlib import Path
 from typing import Tuple, Dict, Any, List
 
-try:
-    from urllib.request import urlopen, Request
-    from urllib.error import URLError, HTTPError
-except Exception:
-    urlopen = None
+from vulhub_common import docker_api, normalize_image_ref
 
 # 與 app.py 一致的根目錄（用你的 VULHUB_PATH）
 VULHUB_PATH = Path(os.environ.get('VULHUB_PATH', './vulhub')).resolve()
 
+# 預先編譯的正則（熱迴圈內使用）
+_IMAGE_LINE_RE = re.compile(r'^\s*image\s*:\s*([^\s#]+)')
+_PORT_MAP_RE = re.compile(r':(\d+)->\d+/(?:tcp|udp)')
+
+
+def local_docker_images() -> set | None:
+    """
+    一次取得本地所有映像（repo:tag 與 repo@digest，已正規化）
+    優先走 Docker Engine API，不行再呼叫一次 `docker images`；兩者都失敗回 None
+    """
+    refs: List[str] = []
+    api_images = docker_api('/images/json')
+    if isinstance(api_images, list):
+        for img in api_images:
+            refs.extend(img.get('RepoTags') or [])
+            refs.extend(img.get('RepoDigests') or [])
+    else:
+        try:
+            result = subprocess.run(
+                ['docker', 'images', '--format', '{{.Repository}}:{{.Tag}}\n{{.Repository}}@{{.Digest}}'],
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+        except Exception:
+            return None
+        if result.returncode != 0:
+            return None
+        refs = result.stdout.splitlines()
+
+    local_images = set()
+    for ref in refs:
+        ref = ref.strip()
+        if not ref or '<none>' in ref:
+            continue
+        local_images.add(normalize_image_ref(ref))
+    return local_images
+
 
 class VulhubOperations:
     def __init__(self):
@@ -66,7 +101,12 @@ class VulhubOperations:
             images = self._fallback_parse_images(env_dir)
 
         missing: List[str] = []
+        local_images = local_docker_images()
         for img in images:
+            if local_images is not None:
+                if normalize_image_ref(img) not in local_images:
+                    missing.append(img)
+                continue
             ok2, _, _ = self._run(['docker', 'image', 'inspect', img])
             if not ok2:
                 missing.append(img)
@@ -75,11 +115,12 @@ class VulhubOperations:
 
     def pull_images_stream(self, name: str):
         """
-        逐行輸出 `docker compose pull` 給 SSE。
+        逐行輸出 `docker compose pull` 給 SSE（每行為 bytes）。
+        以 4KB 為單位讀取 stdout，湊滿完整行才送出。
         """
         env_dir = self._env_dir(name)
         if not env_dir:
-            yield "[Error] 找不到環境"
+            yield "[Error] 找不到環境".encode('utf-8')
             return
 
         cmd = self._cmd(['pull'])
@@ -89,25 +130,40 @@ class VulhubOperations:
                 cwd=str(env_dir),
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
+                bufsize=0
             )
         except FileNotFoundError:
-            yield "[Error] 找不到 docker 指令，請確認已安裝 Docker 並在 PATH 中。"
+            yield "[Error] 找不到 docker 指令，請確認已安裝 Docker 並在 PATH 中。".encode('utf-8')
             return
 
         if proc.stdout:
-            for line in proc.stdout:
-                yield line.rstrip('\n')
+            fd = proc.stdout.fileno()
+            buf = bytearray()
+            while True:
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    break
+                buf += chunk
+                # 只送出到最後一個換行（\n 或進度列常用的 \r）為止，其餘留到下次
+                cut = max(buf.rfind(b'\n'), buf.rfind(b'\r'))
+                if cut < 0:
+                    continue
+                for line in bytes(buf[:cut + 1]).splitlines():
+                    if line:
+                        yield line
+                del buf[:cut + 1]
+            if buf:
+                for line in bytes(buf).splitlines():
+                    if line:
+                        yield line
+            proc.stdout.close()
         proc.wait()
 
     def wait_ready(self, name: str, timeout: int = 20) -> Tuple[bool, Dict[str, Any]]:
         """
-        在 timeout 內嘗試連到第一個對外的 host port；連上就回 ready=True。
+        在 timeout 內嘗試連到第一個對外的 host port，_probe_port 確認服務有回應就回 ready=True。
+        不做 TLS：對純 HTTP 服務做 TLS 握手只會白等。
         """
-        if urlopen is None:
-            return True, {"ready": False}
-
         env_dir = self._env_dir(name)
         if not env_dir:
             return True, {"ready": False}
@@ -119,15 +175,8 @@ class VulhubOperations:
             ports = self._pick_host_ports(env_dir)
             if ports:
                 chosen_port = ports[0]
-                for scheme in ('http', 'https'):
-                    try:
-                        req = Request(f"{scheme}://127.0.0.1:{chosen_port}", headers={'User-Agent': 'curl/8'})
-                        with urlopen(req, timeout=2) as resp:
-                            if 200 <= getattr(resp, 'status', 200) < 400:
-                                return True, {"ready": True, "port": chosen_port}
-                            return True, {"ready": True, "port": chosen_port}
-                    except (URLError, HTTPError, Exception):
-                        pass
+                if self._probe_port(chosen_port):
+                    return True, {"ready": True, "port": chosen_port}
             time.sleep(1.0)
 
         if chosen_port:
@@ -136,6 +185,26 @@ class VulhubOperations:
 
     # ===== 私有工具 =====
 
+    @staticmethod
+    def _probe_port(port: int) -> bool:
+        """
+        先做 TCP 連線，再送一個最小的 HTTP GET 確認真的有服務在回應。
+        Docker 的 userland proxy 在容器一啟動就會接受 127.0.0.1:<port> 的連線，
+        但後端服務還沒 listen 時會立刻把連線關掉（recv 拿到空字串或被 reset），單看 accept 不算 ready。
+        有回任何資料（HTTP 回應、MySQL/SSH 的 banner…）或連線一直開著沒被關，都視為服務已起來。
+        """
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as sock:
+                sock.settimeout(2)
+                sock.sendall(b'GET / HTTP/1.0\r\nHost: 127.0.0.1\r\nUser-Agent: curl/8\r\n\r\n')
+                try:
+                    return bool(sock.recv(1))
+                except socket.timeout:
+                    # 連線沒被 proxy 關掉，只是服務不回應這種請求
+                    return True
+        except OSError:
+            return False
+
     def _detect_compose_cmd(self) -> List[str]:
         ok, _, _ = self._run(['docker', 'compose', 'version'])
         if ok:
@@ -157,7 +226,7 @@ class VulhubOperations:
                 return None
         except Exception:
             return None
-        if not p.exists() or not (p / 'docker-compose.yml').exists():
+        if not os.path.isfile(os.path.join(str(p), 'docker-compose.yml')):
             return None
         return p
 
@@ -182,7 +251,7 @@ class VulhubOperations:
         compose_path = env_dir / 'docker-compose.yml'
         try:
             for ln in compose_path.read_text(encoding='utf-8', errors='ignore').splitlines():
-                m = re.search(r'^\s*image\s*:\s*([^\s#]+)', ln)
+                m = _IMAGE_LINE_RE.search(ln)
                 if m:
                     images.append(m.group(1).strip())
         except Exception:
@@ -211,12 +280,4 @@ class VulhubOperations:
         return ports
 
     def _parse_ports_string(self, s: str) -> List[int]:
-        host_ports: List[int] = []
-        for part in s.split(','):
-            m = re.search(r':(\d+)->\d+/(tcp|udp)', part)
-            if m:
-                try:
-                    host_ports.append(int(m.group(1)))
-                except Exception:
-                    pass
-        return host_ports
+        return [int(p) for p in _PORT_MAP_RE.findall(s)]
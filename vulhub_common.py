@@ -0,0 +1,226 @@
+# vulhub_common.py
+# app.py、operations.py 與 vulhub_manager.py 共用的小工具：
+# 略過目錄的規則、docker-compose.yml 快速掃描、image 名稱正規化、Docker Engine API
+# 各處共用同一份，掃出來的結果與 Docker 查詢方式才會一致
+
+import os
+import re
+import json
+import socket
+import http.client
+from typing import Any
+
+# 走目錄樹時略過的資料夾（另外也略過所有隱藏目錄）；app.py 與 vulhub_manager 共用同一規則
+SKIP_DIRS = frozenset({'node_modules', '__pycache__'})
+
+# parse_compose_fast 用：mapping 的 key 行（縮排、key、同行的值）
+_FAST_KEY_RE = re.compile(rb'^( *)([A-Za-z_][\w.-]*):(?:[ \t]+(.*?))?[ \t]*$')
+# 雙引號、單引號或 plain scalar，可帶行尾註解；ports 項目前面多一個 "- "
+_FAST_SCALAR = rb'(?:"([^"\\]*)"|\'([^\']*)\'|([^\s#\'"&*!|>%@`{\[\]][^#]*?))[ \t]*(?:#.*)?$'
+_FAST_PORT_RE = re.compile(rb'^-[ \t]+' + _FAST_SCALAR)
+_FAST_VALUE_RE = re.compile(rb'^' + _FAST_SCALAR)
+# PyYAML（YAML 1.1）會把沒加引號的 22:22 這類值當 60 進位數字，遇到就交給 yaml
+_SEXAGESIMAL_RE = re.compile(rb'[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+(?:\.[0-9_]*)?')
+# YAML 1.1 會轉成 bool / null 的 plain scalar（service 名稱、image、ports 項目都不能是這些）
+_YAML_SPECIAL_WORDS = frozenset({b'y', b'yes', b'n', b'no', b'true', b'false', b'on', b'off', b'null'})
+
+# Docker Engine API 的 Unix socket（DOCKER_HOST=unix://... 時以它為準）
+# DOCKER_HOST 指向 tcp:// 、ssh:// 等遠端 daemon 時設為 None：本機 socket 是另一個 daemon，一律改走 docker CLI
+_docker_host = os.environ.get('DOCKER_HOST', '')
+if not _docker_host:
+    DOCKER_SOCKET = '/var/run/docker.sock'
+elif _docker_host.startswith('unix://'):
+    DOCKER_SOCKET = _docker_host[len('unix://'):]
+else:
+    DOCKER_SOCKET = None
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """走 Unix socket 的 HTTPConnection"""
+
+    def __init__(self, socket_path: str, timeout: float = 5):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def docker_api(path: str) -> Any:
+    """
+    直接對 Docker Engine API 發 GET（例如 /images/json、/containers/json），回傳解析後的 JSON。
+    DOCKER_HOST 指向非 unix 的 daemon、socket 不存在（如 macOS 的 Docker Desktop 未開放）
+    或請求失敗時回 None，呼叫端改走 docker CLI。
+    """
+    if DOCKER_SOCKET is None or not hasattr(socket, 'AF_UNIX') or not os.path.exists(DOCKER_SOCKET):
+        return None
+    conn = _UnixHTTPConnection(DOCKER_SOCKET)
+    try:
+        conn.request('GET', path, headers={'Host': 'docker'})
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status != 200:
+            return None
+        return json.loads(body)
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+    finally:
+        conn.close()
+
+
+def normalize_image_ref(ref: str) -> str:
+    """
+    把 image 名稱正規化成 `docker images` 列出的格式：
+    去掉 docker.io/ 與 library/ 前綴，沒有 tag/digest 時補上 :latest
+    """
+    ref = ref.strip().strip('"\'')
+    for prefix in ('docker.io/', 'index.docker.io/'):
+        if ref.startswith(prefix):
+            ref = ref[len(prefix):]
+            break
+    if ref.startswith('library/'):
+        ref = ref[len('library/'):]
+    if '@' in ref:
+        # name:tag@digest 以 digest 為準
+        name, digest = ref.split('@', 1)
+        head, _, last = name.rpartition('/')
+        return f"{head + '/' if head else ''}{last.split(':', 1)[0]}@{digest}"
+    if ':' not in ref.rsplit('/', 1)[-1]:
+        ref += ':latest'
+    return ref
+
+
+def is_skipped_dir(name: str) -> bool:
+    """走目錄樹找 docker-compose.yml 時是否略過這個資料夾（隱藏目錄與 SKIP_DIRS）"""
+    return name.startswith('.') or name in SKIP_DIRS
+
+
+def _fast_scalar(m) -> str:
+    """取出 _FAST_PORT_RE / _FAST_VALUE_RE 比對到的 scalar；yaml 可能解讀成非字串的 plain scalar 丟 ValueError"""
+    dq, sq, plain = m.groups()
+    if plain is None:
+        return (dq if dq is not None else sq).decode('utf-8')
+    if (b': ' in plain or plain.endswith(b':') or plain == b'~'
+            or plain.lower() in _YAML_SPECIAL_WORDS or _SEXAGESIMAL_RE.fullmatch(plain)):
+        raise ValueError('mapping item or ambiguous plain scalar')
+    return plain.decode('utf-8')
+
+
+def parse_compose_fast(data: bytes) -> dict:
+    """
+    針對 vulhub 常見寫法的輕量 compose 解析：逐行掃 bytes，只抽 services 名稱、image 與 ports
+    回傳與 yaml 相同形狀的 {'services': {name: {'image': str, 'ports': [...]}}}（沒寫的 key 不會出現）
+    遇到看不懂或可能與 yaml 結果不同的寫法（anchor、<<、flow 語法、tab、縮排不一致…）就丟 ValueError，
+    呼叫端改用 yaml；app.py 與 vulhub_manager 共用這一份，兩邊的結果才會一致
+    """
+    services = None
+    in_services = False
+    svc_indent = None
+    current = None       # 目前 service 的 dict
+    key_indent = None    # 目前 service 底下 key 的縮排
+    ports = None         # 正在讀的 ports list
+    item_indent = None
+    image_pending = False  # 上一個 key 行是 image，下一行若縮排更深就是接續的值
+
+    for line in data.splitlines():
+        stripped = line.lstrip(b' ')
+        if not stripped or stripped[:1] == b'#':
+            continue
+        if stripped[:1] == b'\t':
+            raise ValueError('tab indent')
+        indent = len(line) - len(stripped)
+
+        if ports is not None:
+            if indent > key_indent or (indent == key_indent and stripped[:1] == b'-'):
+                if item_indent is None:
+                    item_indent = indent
+                m = _FAST_PORT_RE.match(stripped)
+                if indent != item_indent or not m:
+                    raise ValueError('unsupported ports item')
+                ports.append(_fast_scalar(m))
+                continue
+            if item_indent is None:
+                raise ValueError('empty ports')
+            ports = None
+
+        if indent == 0:
+            if current is not None and key_indent is None:
+                raise ValueError('empty service')
+            m = _FAST_KEY_RE.match(line)
+            if not m:
+                raise ValueError('unsupported top-level line')
+            in_services = m.group(2) == b'services'
+            if in_services:
+                if services is not None:
+                    raise ValueError('duplicate services')
+                value = m.group(3)
+                if value and value[:1] != b'#':
+                    raise ValueError('inline services value')
+                services = {}
+                svc_indent = None
+                current = None
+            continue
+
+        if not in_services:
+            continue
+
+        if svc_indent is None:
+            svc_indent = indent
+        if indent < svc_indent:
+            raise ValueError('odd indent')
+        if indent == svc_indent:
+            if current is not None and key_indent is None:
+                raise ValueError('empty service')
+            m = _FAST_KEY_RE.match(line)
+            if not m or m.group(2).lower() in _YAML_SPECIAL_WORDS:
+                raise ValueError('unsupported service key')
+            value = m.group(3)
+            if value and value[:1] != b'#':
+                raise ValueError('inline service value')
+            current = {}
+            services[m.group(2).decode('ascii')] = current
+            key_indent = None
+            continue
+
+        if current is None:
+            raise ValueError('odd indent')
+        if key_indent is None:
+            key_indent = indent
+        if indent < key_indent:
+            raise ValueError('odd indent')
+        if indent > key_indent:
+            if image_pending:
+                raise ValueError('multi-line image value')
+            # 其他 key 底下的內容（environment、command 的多行字串…）不需要
+            continue
+        image_pending = False
+        m = _FAST_KEY_RE.match(line)
+        if not m:
+            raise ValueError('unsupported service line')
+        value = m.group(3)
+        if value and value[:1] in (b'&', b'*'):
+            raise ValueError('anchor or alias')
+        key = m.group(2)
+        if key == b'ports':
+            if value and value[:1] != b'#':
+                raise ValueError('inline ports value')
+            ports = current['ports'] = []
+            item_indent = None
+        elif key == b'image':
+            # 值寫在下一行、或 plain scalar 接續到下一行時，yaml 會把它們接起來；一律交給 yaml
+            if not value or value[:1] == b'#':
+                raise ValueError('image without inline value')
+            m = _FAST_VALUE_RE.match(value)
+            if not m:
+                raise ValueError('unsupported image value')
+            current['image'] = _fast_scalar(m)
+            image_pending = True
+
+    if ports is not None and item_indent is None:
+        raise ValueError('empty ports')
+    if not services or key_indent is None:
+        raise ValueError('no services')
+    return {'services': services}
@@ -1,272 +1,525 @@
-#!/usr/bin/env python3
-import os
-import json
-import yaml
-import subprocess
-import hashlib
-import re
-from pathlib import Path
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Optional
-from datetime import datetime
-
-@dataclass
-class VulhubEnvironment:
-    """漏洞環境資料結構"""
-    name: str
-    path: str
-    category: str
-    cve: str
-    services: List[str]
-    ports: Dict[str, str]
-    status: str
-    has_readme: bool
-    has_readme_zh: bool
-    has_images: bool
-    images: List[str]
-    has_exploit: bool
-    exploit_files: List[str]
-    compose_hash: str
-    last_checked: str
-
-class VulhubManager:
-    def __init__(self, vulhub_root: str):
-        self.root = Path(vulhub_root)
-        if not self.root.exists():
-            raise ValueError(f"Vulhub path does not exist: {vulhub_root}")
-        
-        self.environments = []
-        self.cache_file = Path.home() / '.vulhub_manager_cache.json'
-        self.docker_compose_cmd = self._detect_docker_compose()
-        
-    def _detect_docker_compose(self) -> List[str]:
-        """檢測可用的 docker-compose 命令"""
-        commands = [
-            ['docker', 'compose'],  # 新版本
-            ['docker-compose']       # 舊版本
-        ]
-        
-        for cmd in commands:
-            try:
-                result = subprocess.run(
-                    cmd + ['version'],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                if result.returncode == 0:
-                    print(f"使用 Docker Compose 命令: {' '.join(cmd)}")
-                    return cmd
-            except:
-                continue
-        
-        print("警告：無法檢測 Docker Compose，默認使用 'docker compose'")
-        return ['docker', 'compose']
-        
-    def scan(self, use_cache: bool = True) -> List[VulhubEnvironment]:
-        """掃描所有環境"""
-        if use_cache and self.cache_file.exists():
-            cache_age = datetime.now().timestamp() - self.cache_file.stat().st_mtime
-            if cache_age < 3600:  # 快取 1 小時
-                return self._load_from_cache()
-        
-        self.environments = []
-        compose_files = list(self.root.rglob('docker-compose.yml'))
-        
-        print(f"找到 {len(compose_files)} 個環境，開始掃描...")
-        
-        for i, compose_file in enumerate(compose_files, 1):
-            if i % 50 == 0:
-                print(f"已掃描 {i}/{len(compose_files)} 個環境...")
-            
-            try:
-                env = self._parse_environment(compose_file)
-                if env:
-                    self.environments.append(env)
-            except Exception as e:
-                print(f"Error parsing {compose_file}: {e}")
-        
-        print(f"掃描完成，共找到 {len(self.environments)} 個有效環境")
-        self._save_to_cache()
-        return self.environments
-    
-    def _parse_environment(self, compose_path: Path) -> Optional[VulhubEnvironment]:
-        """解析單個環境"""
-        env_dir = compose_path.parent
-        rel_path = env_dir.relative_to(self.root)
-        parts = rel_path.parts
-        
-        parts = rel_path.parts
-        if len(parts) == 0:
-            return None
-        
-        # 在路徑各段尋找 CVE
-        cve_regex = re.compile(r'(?i)^(CVE-\d{4}-\d{4,7})')
-        cve = None
-        cve_idx = None
-        for idx, seg in enumerate(parts):
-            m = cve_regex.match(seg)
-            if m:
-                cve = m.group(1).upper()
-                cve_idx = idx
-                break
-        
-        if cve_idx is not None:
-            # 分類 = CVE 前一段（就近父層）
-            category = parts[cve_idx - 1] if cve_idx > 0 else parts[0]
-        else:
-            # 沒有 CVE：分類取就近父層、cve 以末段描述以示區分
-            category = parts[-2] if len(parts) >= 2 else parts[0]
-            cve = parts[-1] if len(parts) >= 1 else 'unknown'
-        
-        # 用完整相對路徑當唯一識別（避免多個環境同名）
-        name = str(rel_path).replace('\\', '/')
-        
-        # 解析 docker-compose.yml
-        try:
-            with open(compose_path, 'r', encoding='utf-8') as f:
-                compose_content = f.read()
-                compose_config = yaml.safe_load(compose_content)
-                compose_hash = hashlib.md5(compose_content.encode()).hexdigest()
-        except Exception as e:
-            print(f"無法解析 {compose_path}: {e}")
-            return None
-        
-        # 檢查檔案
-        readme_en = env_dir / 'README.md'
-        readme_zh = env_dir / 'README.zh-cn.md'
-        
-        # 找出所有圖片（優化：限制數量）
-        images = []
-        for pattern in ['*.png', '*.jpg', '*.jpeg', '*.gif']:
-            found_images = list(env_dir.glob(pattern))[:3]  # 最多3張圖
-            images.extend([f.name for f in found_images])
-        
-        # 找出所有 exploit 檔案
-        exploit_files = []
-        for py_file in env_dir.glob('*.py'):
-            filename = py_file.name.lower()
-            if any(keyword in filename for keyword in ['exploit', 'poc', 'cve', 'exp']):
-                exploit_files.append(py_file.name)
-        
-        services = list(compose_config.get('services', {}).keys())
-        ports = self._extract_ports(compose_config)
-        
-        # 不在掃描時檢查狀態（提升性能）
-        status = 'unknown'
-        
-        return VulhubEnvironment(
-            name=name,
-            path=str(env_dir),
-            category=category,
-            cve=cve,
-            services=services,
-            ports=ports,
-            status=status,
-            has_readme=readme_en.exists(),
-            has_readme_zh=readme_zh.exists(),
-            has_images=len(images) > 0,
-            images=sorted(images),
-            has_exploit=len(exploit_files) > 0,
-            exploit_files=sorted(exploit_files),
-            compose_hash=compose_hash,
-            last_checked=datetime.now().isoformat()
-        )
-    
-    def _extract_ports(self, config: dict) -> Dict[str, str]:
-        """提取端口映射"""
-        ports = {}
-        for service_name, service in config.get('services', {}).items():
-            if 'ports' in service:
-                for port_mapping in service['ports']:
-                    if ':' in str(port_mapping):
-                        parts = str(port_mapping).split(':')
-                        host_port = parts[0]
-                        container_port = parts[1].split('/')[0]
-                        ports[service_name] = host_port
-                        break  # 只取第一個端口
-        return ports
-    
-    def _check_status(self, env_path: Path) -> str:
-        """檢查環境狀態"""
-        try:
-            result = subprocess.run(
-                self.docker_compose_cmd + ['ps', '-q'],
-                cwd=env_path,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            return 'running' if result.stdout.strip() else 'stopped'
-        except:
-            return 'unknown'
-    
-    def check_single_status(self, env_name: str) -> str:
-        """檢查單個環境的狀態"""
-        env = self.get_environment(env_name)
-        if env:
-            status = self._check_status(Path(env.path))
-            env.status = status
-            return status
-        return 'unknown'
-    
-    def _save_to_cache(self):
-        """保存到快取"""
-        cache_data = [asdict(env) for env in self.environments]
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
-    
-    def _load_from_cache(self) -> List[VulhubEnvironment]:
-        """從快取載入"""
-        print("從快取載入環境資料...")
-        
-        with open(self.cache_file, 'r', encoding='utf-8') as f:
-            cache_data = json.load(f)
-        
-        self.environments = []
-        for data in cache_data:
-            self.environments.append(VulhubEnvironment(**data))
-        
-        print(f"從快取載入了 {len(self.environments)} 個環境")
-        
-        # 批量檢查運行中的環境狀態（優化性能）
-        self._batch_check_status()
-        
-        return self.environments
-    
-    def _batch_check_status(self):
-        """批量檢查環境狀態（只檢查可能運行的）"""
-        print("檢查環境狀態...")
-        
-        # 先獲取所有運行中的容器
-        try:
-            result = subprocess.run(
-                ['docker', 'ps', '--format', '{{.Labels}}'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            running_projects = set()
-            for line in result.stdout.splitlines():
-                if 'com.docker.compose.project.working_dir=' in line:
-                    # 提取項目路徑
-                    parts = line.split('com.docker.compose.project.working_dir=')
-                    if len(parts) > 1:
-                        path = parts[1].split(',')[0]
-                        running_projects.add(path)
-            
-            # 更新狀態
-            for env in self.environments:
-                if env.path in running_projects:
-                    env.status = 'running'
-                else:
-                    env.status = 'stopped'
-        except:
-            # 如果批量檢查失敗，所有環境標記為 unknown
-            for env in self.environments:
-                env.status = 'unknown'
-    
-    def get_environment(self, name: str) -> Optional[VulhubEnvironment]:
-        """獲取特定環境"""
-        return next((env for env in self.environments if env.name == name), None)
\ No newline at end of file
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import yaml
+import subprocess
+import hashlib
+import mmap
+import re
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Optional
+from datetime import datetime
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import quote
+
+from vulhub_common import docker_api, is_skipped_dir, parse_compose_fast
+
+# 有 LibYAML 時用 C 版 loader（比純 Python 快一個數量級），沒有就退回 SafeLoader
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+# 可用時用 orjson 讀寫快取（沒有就退回標準 json）
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+# compose 檔數量達到這個門檻才開行程池（少量檔案時開行程的成本比解析還高）
+PARALLEL_PARSE_MIN = 64
+
+# docker ps Labels 欄位中的 compose 專案路徑
+_WORKDIR_LABEL = 'com.docker.compose.project.working_dir'
+_WORKDIR_RE = re.compile(re.escape(_WORKDIR_LABEL) + r'=([^,]*)')
+
+# exploit 腳本檔名關鍵字（'exp' 已涵蓋 'exploit'，保留完整列表以便閱讀）
+_EXPLOIT_RE = re.compile(r'exploit|poc|cve|exp')
+
+# 路徑段開頭的 CVE 編號
+_CVE_RE = re.compile(r'^(CVE-\d{4}-\d{4,7})', re.IGNORECASE)
+
+@dataclass
+class VulhubEnvironment:
+    """漏洞環境資料結構（用 __slots__ 省掉每筆的 __dict__）"""
+    __slots__ = ('name', 'path', 'category', 'cve', 'services', 'ports', 'status',
+                 'has_readme', 'has_readme_zh', 'has_images', 'images', 'has_exploit',
+                 'exploit_files', 'compose_hash', 'last_checked', 'mtime', 'dir_mtime')
+    name: str
+    path: str
+    category: str
+    cve: str
+    services: List[str]
+    ports: Dict[str, str]
+    status: str
+    has_readme: bool
+    has_readme_zh: bool
+    has_images: bool
+    images: List[str]
+    has_exploit: bool
+    exploit_files: List[str]
+    compose_hash: str
+    last_checked: str
+    # 增量掃描用（__slots__ 不能有預設值，舊快取載入時補 0.0）
+    mtime: float      # docker-compose.yml 的 st_mtime
+    dir_mtime: float  # 環境目錄的 st_mtime（README、圖片、exploit 檔有增刪時會變）
+
+class VulhubManager:
+    def __init__(self, vulhub_root: str):
+        self.root = Path(vulhub_root)
+        if not self.root.exists():
+            raise ValueError(f"Vulhub path does not exist: {vulhub_root}")
+        self.root_str = str(self.root)
+        
+        self.environments = []
+        # name / path -> VulhubEnvironment 索引，scan 與載入快取後重建
+        self._by_name: Dict[str, VulhubEnvironment] = {}
+        self._by_path: Dict[str, VulhubEnvironment] = {}
+        self.cache_file = Path.home() / '.vulhub_manager_cache.json'
+        self.docker_compose_cmd = self._detect_docker_compose()
+        
+    def _detect_docker_compose(self) -> List[str]:
+        """檢測可用的 docker-compose 命令"""
+        commands = [
+            ['docker', 'compose'],  # 新版本
+            ['docker-compose']       # 舊版本
+        ]
+        
+        for cmd in commands:
+            try:
+                result = subprocess.run(
+                    cmd + ['version'],
+                    capture_output=True,
+                    text=True,
+                    timeout=5
+                )
+                if result.returncode == 0:
+                    print(f"使用 Docker Compose 命令: {' '.join(cmd)}")
+                    return cmd
+            except:
+                continue
+        
+        print("警告：無法檢測 Docker Compose，默認使用 'docker compose'")
+        return ['docker', 'compose']
+        
+    def scan(self, use_cache: bool = True,
+             include_dirs: Optional[List[str]] = None) -> List[VulhubEnvironment]:
+        """
+        掃描所有環境
+        include_dirs: 只重新掃描這些子目錄（相對於 vulhub 根目錄，如 ['nginx', 'php']），
+                      其餘目錄沿用快取中的紀錄；沒有可用的舊快取時改為全掃
+        """
+        starts = self._resolve_include_dirs(include_dirs) if include_dirs else None
+        
+        if starts is None and use_cache and self.cache_file.exists():
+            cache_age = datetime.now().timestamp() - self.cache_file.stat().st_mtime
+            if cache_age < 3600:  # 快取 1 小時
+                return self._load_from_cache()
+        
+        # 增量掃描：舊快取載入 _by_path，compose 檔與環境目錄的 mtime 都沒變就直接沿用舊紀錄
+        if use_cache or starts is not None:
+            self._load_cached_records()
+        else:
+            self._by_path = {}
+        
+        # 沒有舊快取可以補上範圍外的環境時改走全掃，否則存下來的快取只剩部分環境
+        if starts is not None and not self._by_path:
+            print("沒有可用的舊快取，改為掃描整個 vulhub 目錄")
+            starts = None
+        
+        # 只掃部分子目錄時，範圍外的環境原樣保留
+        kept = []
+        if starts is not None:
+            prefixes = tuple(start + os.sep for start in starts)
+            kept = [env for path, env in self._by_path.items()
+                    if path not in starts and not path.startswith(prefixes)]
+        cached = self._by_path if use_cache else {}
+        
+        self.environments = []
+        compose_files = list(self._iter_compose_files(starts))
+        
+        print(f"找到 {len(compose_files)} 個環境，開始掃描...")
+        
+        results: List[Optional[VulhubEnvironment]] = [None] * len(compose_files)
+        changed_idx = []
+        for idx, compose_file in enumerate(compose_files):
+            env = cached.get(os.path.dirname(compose_file))
+            if env is not None:
+                try:
+                    if (os.stat(compose_file).st_mtime == env.mtime
+                            and os.stat(env.path).st_mtime == env.dir_mtime):
+                        results[idx] = env
+                        continue
+                except OSError:
+                    pass
+            changed_idx.append(idx)
+        
+        if cached:
+            print(f"沿用快取 {len(compose_files) - len(changed_idx)} 個，重新解析 {len(changed_idx)} 個")
+        
+        # 在主行程 intern 重複出現的字串（子行程的 intern 經 pickle 回傳後就不共用了）
+        intern = sys.intern
+        changed = [compose_files[idx] for idx in changed_idx]
+        total = len(changed)
+        for i, (idx, env) in enumerate(zip(changed_idx, self._parse_all(changed)), 1):
+            if i % 50 == 0:
+                print(f"已掃描 {i}/{total} 個環境...")
+            if env is not None:
+                env.category = intern(env.category)
+                env.cve = intern(env.cve)
+                # YAML 會把 1: / on: 這類 key 轉成 int / bool，只 intern 字串
+                env.services = [intern(svc) if isinstance(svc, str) else svc for svc in env.services]
+            results[idx] = env
+        
+        self.environments = kept + [env for env in results if env is not None]
+        print(f"掃描完成，共找到 {len(self.environments)} 個有效環境")
+        self._rebuild_index()
+        self._save_to_cache()
+        return self.environments
+    
+    def _resolve_include_dirs(self, include_dirs: List[str]) -> Optional[List[str]]:
+        """把 include_dirs 轉成根目錄下的絕對路徑字串；超出根目錄的項目略過，含根目錄本身時回 None（全掃）"""
+        root = self.root_str
+        starts = []
+        for d in include_dirs:
+            start = os.path.normpath(os.path.join(root, d))
+            if start == root:
+                # 包含根目錄等於全掃
+                return None
+            if not start.startswith(root + os.sep):
+                print(f"略過不在 vulhub 目錄內的路徑: {d}")
+                continue
+            starts.append(start)
+        return starts
+    
+    def _iter_compose_files(self, starts: Optional[List[str]] = None):
+        """
+        以 os.walk 遞迴尋找 docker-compose.yml，逐一產出路徑字串
+        就地修剪 dirnames，跳過隱藏目錄、node_modules 與 __pycache__，不往下走
+        starts 指定時只從這些子目錄開始走，不碰其他兄弟目錄
+        """
+        for start in (starts if starts is not None else [self.root_str]):
+            for dirpath, dirnames, filenames in os.walk(start, followlinks=False):
+                dirnames[:] = [d for d in dirnames if not is_skipped_dir(d)]
+                if 'docker-compose.yml' in filenames:
+                    yield os.path.join(dirpath, 'docker-compose.yml')
+    
+    def _parse_all(self, compose_files: List[str]):
+        """
+        解析所有 compose 檔（YAML 解析吃 CPU，檔案多時分給多個行程並行）
+        依 compose_files 順序逐一產出 VulhubEnvironment 或 None
+        """
+        root = self.root_str
+        done = 0  # 已產出的筆數；行程池中途壞掉時，逐一解析從這裡接著做
+        if len(compose_files) >= PARALLEL_PARSE_MIN:
+            try:
+                with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                    for env in executor.map(_parse_environment_safe, compose_files,
+                                            repeat(root), chunksize=32):
+                        yield env
+                        done += 1
+                return
+            except (OSError, BrokenProcessPool) as e:
+                print(f"無法使用多行程解析，改為逐一解析: {e}")
+        parse = _parse_environment_safe
+        for compose_file in compose_files[done:]:
+            yield parse(compose_file, root)
+    
+    @staticmethod
+    def _parse_environment(compose_path: str, root: str) -> Optional[VulhubEnvironment]:
+        """解析單個環境（staticmethod，才能丟給子行程）"""
+        env_dir = os.path.dirname(compose_path)
+        rel_path = os.path.relpath(env_dir, root)
+        parts = tuple(p for p in rel_path.split(os.sep) if p != os.curdir)
+        if len(parts) == 0:
+            return None
+        
+        # 在路徑各段尋找 CVE（先比前綴，大部分路徑段不必進正則）
+        cve = None
+        cve_idx = None
+        for idx, seg in enumerate(parts):
+            if seg[:4].upper() != 'CVE-':
+                continue
+            m = _CVE_RE.match(seg)
+            if m:
+                cve = m.group(1).upper()
+                cve_idx = idx
+                break
+        
+        if cve_idx is not None:
+            # 分類 = CVE 前一段（就近父層）
+            category = parts[cve_idx - 1] if cve_idx > 0 else parts[0]
+        else:
+            # 沒有 CVE：分類取就近父層、cve 以末段描述以示區分
+            category = parts[-2] if len(parts) >= 2 else parts[0]
+            cve = parts[-1] if len(parts) >= 1 else 'unknown'
+        
+        # 用完整相對路徑當唯一識別（避免多個環境同名）
+        name = '/'.join(parts)
+        
+        # 解析 docker-compose.yml
+        try:
+            # 以 bytes 讀入，直接交給 hasher 與 yaml（YAML loader 自行解碼，省一次 encode）
+            # 超過一個 page 的檔案改用 mmap，交給 kernel 依需求分頁讀入
+            with open(compose_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if st.st_size > mmap.PAGESIZE:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        compose_hash = hashlib.blake2b(mm, digest_size=16).hexdigest()
+                        compose_config = yaml.load(mm, Loader=_YamlLoader)
+                else:
+                    compose_content = f.read()
+                    compose_hash = hashlib.blake2b(compose_content, digest_size=16).hexdigest()
+                    # 常見的小檔先走只抽 services / ports 的快速解析，看不懂的寫法才交給 yaml
+                    try:
+                        compose_config = parse_compose_fast(compose_content)
+                    except ValueError:
+                        compose_config = yaml.load(compose_content, Loader=_YamlLoader)
+        except Exception as e:
+            print(f"無法解析 {compose_path}: {e}")
+            return None
+        
+        # 單次 scandir 走過環境目錄，同時找出 README、圖片與 exploit 檔案
+        # 目錄 mtime 在 scandir 之前取，期間若有變動，下次掃描會再重新解析
+        try:
+            dir_mtime = os.stat(env_dir).st_mtime
+        except OSError:
+            dir_mtime = 0.0
+        has_readme = False
+        has_readme_zh = False
+        images = []
+        exploit_files = []
+        try:
+            with os.scandir(env_dir) as it:
+                entries = list(it)
+        except OSError:
+            entries = []
+        for e in entries:
+            fname = e.name
+            if fname == 'README.md':
+                has_readme = True
+                continue
+            if fname == 'README.zh-cn.md':
+                has_readme_zh = True
+                continue
+            if fname.endswith(('.png', '.jpg', '.jpeg', '.gif')):
+                # 找出所有圖片（優化：限制數量）
+                if len(images) < 12 and e.is_file():
+                    images.append(fname)
+            elif fname.endswith('.py'):
+                lname = fname.lower()
+                if _EXPLOIT_RE.search(lname) and e.is_file():
+                    exploit_files.append(fname)
+        
+        services = list(compose_config.get('services', {}).keys())
+        ports = VulhubManager._extract_ports(compose_config)
+        
+        # 就地排序，不另建 sorted() 副本
+        images.sort()
+        exploit_files.sort()
+        
+        # 不在掃描時檢查狀態（提升性能）
+        status = 'unknown'
+        
+        return VulhubEnvironment(
+            name=name,
+            path=env_dir,
+            category=category,
+            cve=cve,
+            services=services,
+            ports=ports,
+            status=status,
+            has_readme=has_readme,
+            has_readme_zh=has_readme_zh,
+            has_images=len(images) > 0,
+            images=images,
+            has_exploit=len(exploit_files) > 0,
+            exploit_files=exploit_files,
+            compose_hash=compose_hash,
+            last_checked=datetime.now().isoformat(),
+            mtime=st.st_mtime,
+            dir_mtime=dir_mtime
+        )
+    
+    @staticmethod
+    def _extract_ports(config: dict) -> Dict[str, str]:
+        """提取端口映射"""
+        ports = {}
+        for service_name, service in config.get('services', {}).items():
+            mappings = service.get('ports')
+            if not mappings:
+                continue
+            for port_mapping in mappings:
+                s = port_mapping if isinstance(port_mapping, str) else str(port_mapping)
+                # partition 不建中間 list；只需要 host 端
+                host_port, sep, _ = s.partition(':')
+                if sep:
+                    ports[service_name] = host_port
+                    break  # 只取第一個端口
+        return ports
+    
+    def _check_status(self, env_path: Path) -> str:
+        """檢查環境狀態"""
+        try:
+            result = subprocess.run(
+                self.docker_compose_cmd + ['ps', '-q'],
+                cwd=env_path,
+                capture_output=True,
+                text=True,
+                timeout=5
+            )
+            return 'running' if result.stdout.strip() else 'stopped'
+        except:
+            return 'unknown'
+    
+    def check_single_status(self, env_name: str) -> str:
+        """檢查單個環境的狀態"""
+        env = self.get_environment(env_name)
+        if env:
+            status = self._check_status(Path(env.path))
+            env.status = status
+            return status
+        return 'unknown'
+    
+    def _save_to_cache(self):
+        """保存到快取"""
+        if orjson:
+            # orjson 原生支援 dataclass，不必先 asdict；
+            # ports 的 key 可能是 YAML 轉出的 int / bool（如 1: 、on:），比照 json 轉成字串
+            raw = orjson.dumps(self.environments, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            cache_data = [asdict(env) for env in self.environments]
+            raw = json.dumps(cache_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.cache_file.write_bytes(raw)
+    
+    def _read_cache(self) -> List[dict]:
+        """讀出快取檔的原始紀錄"""
+        raw = self.cache_file.read_bytes()
+        return orjson.loads(raw) if orjson else json.loads(raw)
+    
+    def _load_cached_records(self):
+        """把舊快取（不論新舊）載入 _by_path，供增量掃描比對；讀不到就當沒有快取"""
+        self._by_path = {}
+        if not self.cache_file.exists():
+            return
+        try:
+            cache_data = self._read_cache()
+            by_path = {}
+            for data in cache_data:
+                data.setdefault('mtime', 0.0)
+                data.setdefault('dir_mtime', 0.0)
+                _intern_fields(data)
+                by_path[data['path']] = VulhubEnvironment(**data)
+            self._by_path = by_path
+        except Exception as e:
+            print(f"讀取舊快取失敗，全部重新解析: {e}")
+    
+    def _load_from_cache(self) -> List[VulhubEnvironment]:
+        """從快取載入"""
+        print("從快取載入環境資料...")
+        
+        cache_data = self._read_cache()
+        
+        # 載入時預設為 stopped，_batch_check_status 只需標記運行中的環境
+        self.environments = []
+        append = self.environments.append
+        for data in cache_data:
+            data['status'] = 'stopped'
+            data.setdefault('mtime', 0.0)
+            data.setdefault('dir_mtime', 0.0)
+            _intern_fields(data)
+            append(VulhubEnvironment(**data))
+        
+        print(f"從快取載入了 {len(self.environments)} 個環境")
+        self._rebuild_index()
+        
+        # 批量檢查運行中的環境狀態（優化性能）
+        self._batch_check_status()
+        
+        return self.environments
+    
+    def _batch_check_status(self):
+        """批量檢查環境狀態（只檢查可能運行的）"""
+        print("檢查環境狀態...")
+        
+        # 先獲取所有運行中的容器：優先直接問 Docker Engine API，不行再 fork docker ps
+        running_projects = self._running_projects_api()
+        if running_projects is None:
+            try:
+                running_projects = self._running_projects_cli()
+            except:
+                # 如果批量檢查失敗，所有環境標記為 unknown
+                for env in self.environments:
+                    env.status = 'unknown'
+                return
+        
+        # 更新狀態：載入時已預設 stopped，只走訪運行中的專案
+        by_path = self._by_path
+        for path in running_projects:
+            env = by_path.get(path)
+            if env is not None:
+                env.status = 'running'
+    
+    @staticmethod
+    def _running_projects_api() -> Optional[set]:
+        """經 Docker socket 取得帶 compose working_dir 標籤的容器；socket 不可用時回 None"""
+        query = quote(json.dumps({'label': [_WORKDIR_LABEL]}))
+        containers = docker_api(f'/containers/json?filters={query}')
+        if not isinstance(containers, list):
+            return None
+        running_projects = set()
+        add = running_projects.add
+        for c in containers:
+            path = (c.get('Labels') or {}).get(_WORKDIR_LABEL)
+            if path:
+                add(path)
+        return running_projects
+    
+    @staticmethod
+    def _running_projects_cli() -> set:
+        """以 docker ps 的 Labels 欄位取得運行中的 compose 專案路徑"""
+        result = subprocess.run(
+            ['docker', 'ps', '--format', '{{.Labels}}'],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        
+        running_projects = set()
+        add = running_projects.add
+        search = _WORKDIR_RE.search
+        for line in result.stdout.splitlines():
+            # 提取項目路徑
+            m = search(line)
+            if m:
+                add(m.group(1))
+        return running_projects
+    
+    def _rebuild_index(self):
+        """依 self.environments 重建 name / path 索引"""
+        self._by_name = {env.name: env for env in self.environments}
+        self._by_path = {env.path: env for env in self.environments}
+    
+    def get_environment(self, name: str) -> Optional[VulhubEnvironment]:
+        """獲取特定環境"""
+        return self._by_name.get(name)
+
+
+def _intern_fields(data: dict, intern=sys.intern):
+    """快取紀錄中 category / cve / services 大量重複，intern 後共用同一個字串物件（非字串的 service 名稱原樣保留）"""
+    data['category'] = intern(data['category'])
+    data['cve'] = intern(data['cve'])
+    data['services'] = [intern(svc) if isinstance(svc, str) else svc for svc in data['services']]
+
+
+def _parse_environment_safe(compose_path: str, root: str) -> Optional[VulhubEnvironment]:
+    """子行程的進入點：解析單個環境，出錯時印出並回 None"""
+    try:
+        return VulhubManager._parse_environment(compose_path, root)
+    except Exception as e:
+        print(f"Error parsing {compose_path}: {e}")
+        return None